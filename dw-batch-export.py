@@ -11,17 +11,35 @@ Additions:
 from __future__ import annotations
 
 import argparse
+import importlib.util
 import logging
 import random
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime
 from pathlib import Path
-from subprocess import run
+from typing import TextIO
 
 LOG = logging.getLogger("dw_batch")
 
 
+def _load_downloader():
+    """
+    Import dw-downloader.py as a module (the hyphenated filename keeps it
+    off the normal import path).
+    """
+    path = Path(__file__).with_name("dw-downloader.py")
+    spec = importlib.util.spec_from_file_location("dw_downloader", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["dw_downloader"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+dw_downloader = _load_downloader()
+
+
 def configure_logging(level: str) -> None:
     numeric = getattr(logging, level.upper(), None)
     if not isinstance(numeric, int):
@@ -32,14 +50,14 @@ def configure_logging(level: str) -> None:
     )
 
 
-def month_range(start_year: int, start_month: int, end_year: int, end_month: int):
-    y, m = start_year, start_month
-    while (y, m) <= (end_year, end_month):
-        yield y, m
-        m += 1
-        if m > 12:
-            m = 1
-            y += 1
+def month_range(start_year: int, start_month: int, end_year: int, end_month: int) -> list[tuple[int, int]]:
+    """
+    Inclusive list of (year, month) pairs, computed arithmetically over a
+    flat month index so the range is branchless and indexable.
+    """
+    start = start_year * 12 + start_month - 1
+    end = end_year * 12 + end_month - 1
+    return [(i // 12, i % 12 + 1) for i in range(start, end + 1)]
 
 
 def polite_pause(min_s: int, max_s: int, reason: str):
@@ -49,19 +67,16 @@ def polite_pause(min_s: int, max_s: int, reason: str):
 
 
 def record_failure(
-    path: Path,
+    fp: TextIO,
     year: int,
     month: int,
     exit_code: int | None,
 ):
     """
-    Append a failure record to failed_months.csv
+    Append a failure record to the open failure-log handle.
     """
     timestamp = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    line = f"{year:04d},{month:02d},{timestamp},{exit_code}\n"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(line)
+    fp.write(f"{year:04d},{month:02d},{timestamp},{exit_code}\n")
 
 
 def main() -> int:
@@ -81,6 +96,13 @@ def main() -> int:
     ap.add_argument("--grumpy-pause-min", type=int, default=30)
     ap.add_argument("--grumpy-pause-max", type=int, default=60)
 
+    ap.add_argument(
+        "--max-workers",
+        type=int,
+        default=3,
+        help="Number of months to export concurrently",
+    )
+
     ap.add_argument(
         "--failure-log",
         default="failed_months.csv",
@@ -94,78 +116,125 @@ def main() -> int:
     outdir.mkdir(parents=True, exist_ok=True)
 
     failure_log = Path(args.failure_log)
-    failures = 0
+    failure_log.parent.mkdir(parents=True, exist_ok=True)
+
+    # One append-mode handle for the whole run: failures go to the libc
+    # buffer instead of paying open/write/close per record.
+    with failure_log.open("a", encoding="utf-8", buffering=8192) as fail_fp:
+        rc = run_batch(args, fail_fp)
 
+    if rc == 0:
+        LOG.info("Batch export complete")
+        LOG.info("Failure log written to: %s", failure_log)
+    return rc
+
+
+def export_one(session, year: int, month: int, args: argparse.Namespace) -> tuple[int, int, int | None]:
+    """
+    Export a single month in a worker thread, calling the downloader
+    in-process with a shared authenticated session.
+
+    Returns (year, month, exit_code); exit_code 0 means success.
+    The worker does its own polite pause so the back-off still bounds
+    per-worker request rate.
+    """
+    outdir = Path(args.outdir)
+    name = args.journal or "default"
+    outfile = outdir / f"dw_export_{name}_{year:04d}-{month:02d}.xml"
+
+    LOG.info("Exporting %04d-%02d", year, month)
+
+    try:
+        code = dw_downloader.export_month(
+            session,
+            year,
+            month,
+            journal=args.journal,
+            outdir=outdir,
+        )
+    except Exception:
+        LOG.exception("Unhandled error exporting %04d-%02d", year, month)
+        code = 1
+
+    if code == 0 and outfile.exists():
+        LOG.info("Success: %04d-%02d", year, month)
+        polite_pause(
+            args.normal_pause_min,
+            args.normal_pause_max,
+            "normal",
+        )
+        return year, month, 0
+
+    LOG.warning("Failure exporting %04d-%02d (exit=%s)", year, month, code)
+
+    polite_pause(
+        args.grumpy_pause_min,
+        args.grumpy_pause_max,
+        "grumpy",
+    )
+
+    # Exit code 0 with a missing outfile is still a failure
+    return year, month, code if code != 0 else -1
+
+
+def run_batch(args: argparse.Namespace, fail_fp: TextIO) -> int:
+    outdir = Path(args.outdir)
+    name = args.journal or "default"
+
+    # One session for the whole run: cookies load once, connections are
+    # pooled, and no per-month interpreter startup or module imports.
+    session = dw_downloader.build_session(cookie_file=Path(args.cookie_file))
+
+    # One directory listing instead of a stat() per month.
+    existing = {p.name for p in outdir.iterdir() if p.suffix == ".xml"}
+
+    months = []
     for year, month in month_range(
         args.start_year,
         args.start_month,
         args.end_year,
         args.end_month,
     ):
-        name = args.journal or "default"
         outfile = outdir / f"dw_export_{name}_{year:04d}-{month:02d}.xml"
-
-        if outfile.exists():
+        if outfile.name in existing:
             LOG.info("Skipping %04d-%02d (already exists)", year, month)
             continue
+        months.append((year, month))
 
-        LOG.info("Exporting %04d-%02d", year, month)
-
-        cmd = [
-            sys.executable,
-            "dw-downloader.py",
-            "--year", str(year),
-            "--month", str(month),
-            "--cookie-file", args.cookie_file,
-            "--outdir", args.outdir,
-        ]
-
-        if args.journal:
-            cmd.extend(["--journal", args.journal])
-
-        result = run(cmd, capture_output=True, text=True)
-
-        if result.returncode == 0 and outfile.exists():
-            LOG.info("Success: %04d-%02d", year, month)
-            failures = 0
-            polite_pause(
-                args.normal_pause_min,
-                args.normal_pause_max,
-                "normal",
-            )
-            continue
-
-        # Failure path
-        failures += 1
-        LOG.warning(
-            "Failure exporting %04d-%02d (exit=%s)",
-            year, month, result.returncode
-        )
-
-        record_failure(
-            failure_log,
-            year,
-            month,
-            result.returncode,
-        )
-
-        if result.stdout:
-            LOG.warning("stdout:\n%s", result.stdout.strip())
-        if result.stderr:
-            LOG.warning("stderr:\n%s", result.stderr.strip())
+    failures = 0
 
-        polite_pause(
-            args.grumpy_pause_min,
-            args.grumpy_pause_max,
-            f"grumpy (consecutive failures: {failures})",
-        )
+    # Months run in a bounded pool of worker threads (the work is
+    # network-bound, so in-process calls with a shared session need no
+    # process isolation); failure records stay ordered because they are
+    # written from this thread only.
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        futures = {
+            executor.submit(export_one, session, year, month, args): (year, month)
+            for year, month in months
+        }
+        for fut in as_completed(futures):
+            year, month, exit_code = fut.result()
+
+            if exit_code == 0:
+                failures = 0
+                # keep the cached listing honest for re-exports in-run
+                existing.add(f"dw_export_{name}_{year:04d}-{month:02d}.xml")
+                continue
+
+            failures += 1
+            record_failure(
+                fail_fp,
+                year,
+                month,
+                exit_code,
+            )
 
-        if failures >= 5:
-            LOG.error("Too many consecutive failures — stopping batch run")
-            return 3
+            if failures >= 5:
+                LOG.error("Too many consecutive failures — stopping batch run")
+                for pending in futures:
+                    pending.cancel()
+                return 3
 
-    LOG.info("Batch export complete")
-    LOG.info("Failure log written to: %s", failure_log)
     return 0
 
 
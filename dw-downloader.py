@@ -4,6 +4,7 @@ from __future__ import annotations
 import argparse
 import logging
 import random
+import re
 import sys
 import time
 from dataclasses import dataclass
@@ -55,12 +56,15 @@ def load_netscape_cookie_file(path: Path, domain="dreamwidth.org") -> Dict[str,
     if not path.exists():
         raise FileNotFoundError(f"Cookie file not found: {path}")
     cookies: Dict[str, str] = {}
-    for line in path.read_text(errors="ignore").splitlines():
-        if not line or line.startswith("#"):
-            continue
-        parts = line.split("\t")
-        if len(parts) >= 7 and domain in parts[0]:
-            cookies[parts[5]] = parts[6]
+    # Iterate the file object directly rather than materializing the whole
+    # text plus a splitlines() list; split(…, 6) stops once 7 fields exist.
+    with path.open("r", errors="ignore") as fp:
+        for line in fp:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t", 6)
+            if len(parts) == 7 and domain in parts[0]:
+                cookies[parts[5]] = parts[6]
     if not cookies:
         raise RuntimeError(f"No cookies for domain containing '{domain}' found in {path}")
     return cookies
@@ -91,8 +95,7 @@ def request_with_retries(
     raise RuntimeError(f"Failed after {cfg.max_retries} attempts: {method} {url}")
 
 
-def choose_export_form(html: str):
-    soup = BeautifulSoup(html, "html.parser")
+def choose_export_form(soup: BeautifulSoup):
     forms = soup.find_all("form")
     if not forms:
         raise RuntimeError("No <form> found on /export page. Are you logged in?")
@@ -106,15 +109,16 @@ def choose_export_form(html: str):
     return forms[0]
 
 
-def build_form_payload(form) -> Dict[str, str]:
+def build_form_payload(form, inputs: List, selects: List) -> Dict[str, str]:
     data: Dict[str, str] = {}
 
-    for inp in form.find_all("input"):
-        name = inp.get("name")
+    for inp in inputs:
+        _get = inp.get
+        name = _get("name")
         if not name:
             continue
-        itype = (inp.get("type") or "text").lower()
-        value = inp.get("value", "")
+        itype = (_get("type") or "text").lower()
+        value = _get("value", "")
 
         if itype in ("submit", "button", "image", "file"):
             continue
@@ -126,7 +130,7 @@ def build_form_payload(form) -> Dict[str, str]:
 
         data[name] = value
 
-    for sel in form.find_all("select"):
+    for sel in selects:
         name = sel.get("name")
         if not name:
             continue
@@ -146,11 +150,11 @@ def build_form_payload(form) -> Dict[str, str]:
     return data
 
 
-def guess_year_month_field_names(form) -> Tuple[str, str]:
+def guess_year_month_field_names(selects: List) -> Tuple[str, str]:
     year_field = "year"
     month_field = "month"
 
-    for sel in form.find_all("select"):
+    for sel in selects:
         name = sel.get("name")
         if not name:
             continue
@@ -165,7 +169,7 @@ def guess_year_month_field_names(form) -> Tuple[str, str]:
     return year_field, month_field
 
 
-def force_output_format_xml(form, payload: Dict[str, str]) -> bool:
+def force_output_format_xml(inputs: List, selects: List, payload: Dict[str, str]) -> bool:
     """
     Find a likely "output format" field and set it to XML.
     Returns True if we changed something.
@@ -173,31 +177,34 @@ def force_output_format_xml(form, payload: Dict[str, str]) -> bool:
     changed = False
     candidates: List[Tuple[str, List[Tuple[str, str]]]] = []
 
-    # Look at selects for an option that looks like XML
-    for sel in form.find_all("select"):
+    # Look at selects for an option that looks like XML; test each option
+    # as it is seen so a match returns before the candidates list grows.
+    for sel in selects:
         name = sel.get("name")
         if not name:
             continue
         opts: List[Tuple[str, str]] = []
         for o in sel.find_all("option"):
-            label = (o.get_text(strip=True) or "")
-            value = o.get("value", "")
-            opts.append((value, label))
-        candidates.append((name, opts))
-
-        for value, label in opts:
-            if "xml" in (value or "").lower() or "xml" in (label or "").lower():
+            _get = o.get
+            label = o.get_text(strip=True) or ""
+            value = _get("value", "")
+            if "xml" in value.lower() or "xml" in label.lower():
                 payload[name] = value if value != "" else label
                 LOG.info("Set output format field '%s' to XML (%r)", name, payload[name])
                 return True  # stop at first decisive match
+            opts.append((value, label))
+        candidates.append((name, opts))
 
     # If no select matched, try radios
     radio_groups: Dict[str, List[Tuple[str, str]]] = {}
-    for inp in form.find_all("input", {"type": "radio"}):
-        name = inp.get("name")
+    for inp in inputs:
+        _get = inp.get
+        if (_get("type") or "").lower() != "radio":
+            continue
+        name = _get("name")
         if not name:
             continue
-        value = inp.get("value", "")
+        value = _get("value", "")
         # label text is not always adjacent, but value is often enough
         radio_groups.setdefault(name, []).append((value, value))
 
@@ -217,16 +224,16 @@ def force_output_format_xml(form, payload: Dict[str, str]) -> bool:
     return changed
 
 
-def looks_like_xml_export(resp: requests.Response) -> bool:
-    ct = (resp.headers.get("Content-Type") or "").lower()
-    text = resp.text.lstrip()
+_XML_MARKERS = re.compile(rb"<\?xml|<livejournal|<lj:livejournal|<event|<entry", re.IGNORECASE)
 
-    if "xml" in ct:
+
+def looks_like_xml_export(content_type: str, head: bytes) -> bool:
+    if "xml" in content_type.lower():
         return True
 
-    head = text[:5000].lower()
-    markers = ["<?xml", "<livejournal", "<lj:livejournal", "<event", "<entry"]
-    return any(m in head for m in markers)
+    # One pass of a pre-compiled alternation over the raw bytes instead of
+    # five substring scans of a lowered copy.
+    return _XML_MARKERS.search(head) is not None
 
 
 def write_debug_artifacts(
@@ -236,6 +243,7 @@ def write_debug_artifacts(
     stage: str,
     resp: requests.Response,
     request_url: str,
+    body: Optional[bytes] = None,
 ) -> None:
     debug_dir.mkdir(parents=True, exist_ok=True)
     ct = (resp.headers.get("Content-Type") or "").lower()
@@ -243,7 +251,9 @@ def write_debug_artifacts(
     body_path = debug_dir / f"{stage}_{year:04d}-{month:02d}_body.{ext}"
     meta_path = debug_dir / f"{stage}_{year:04d}-{month:02d}_meta.txt"
 
-    body_path.write_text(resp.text, encoding="utf-8", errors="replace")
+    if body is None:
+        body = resp.content
+    body_path.write_bytes(body)
 
     lines = [
         f"stage: {stage}",
@@ -260,29 +270,13 @@ def write_debug_artifacts(
     LOG.error("Wrote debug meta to: %s", meta_path)
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser(description="Export a single Dreamwidth journal month as XML")
-    ap.add_argument("--year", type=int, required=True, help="Year to export (e.g. 2006)")
-    ap.add_argument("--month", type=int, required=True, help="Month to export (1–12)")
-    ap.add_argument("--cookie-file", help="Netscape cookies.txt containing dreamwidth.org cookies")
-    ap.add_argument("--cookie-header", help="Raw Cookie header from browser devtools")
-    ap.add_argument("--journal", default="", help="Journal/community name (optional)")
-    ap.add_argument("--outdir", default="dw_exports", help="Output directory for XML exports")
-    ap.add_argument("--debug-dir", default="dw_debug", help="Directory to write failure responses")
-    ap.add_argument("--print-snippet", action="store_true", help="Print first ~2k chars of failure response")
-    ap.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING, ERROR")
-    args = ap.parse_args()
-
-    configure_logging(args.log_level)
-
-    if not (1 <= args.month <= 12):
-        LOG.error("--month must be between 1 and 12")
-        return 2
-    if not args.cookie_file and not args.cookie_header:
-        LOG.error("You must supply --cookie-file or --cookie-header")
-        return 2
-
-    cfg = RateLimitConfig()
+def build_session(
+    cookie_file: Optional[Path] = None,
+    cookie_header: Optional[str] = None,
+) -> requests.Session:
+    """
+    Build a requests.Session with the standard headers and cookies loaded.
+    """
     session = requests.Session()
     session.headers.update(
         {
@@ -291,75 +285,153 @@ def main() -> int:
         }
     )
 
-    if args.cookie_file:
-        session.cookies.update(load_netscape_cookie_file(Path(args.cookie_file)))
-        LOG.info("Loaded cookies from %s", args.cookie_file)
+    if cookie_file:
+        session.cookies.update(load_netscape_cookie_file(cookie_file))
+        LOG.info("Loaded cookies from %s", cookie_file)
     else:
-        session.cookies.update(parse_cookie_header(args.cookie_header))
+        session.cookies.update(parse_cookie_header(cookie_header or ""))
         LOG.info("Loaded cookies from --cookie-header")
 
+    return session
+
+
+def export_month(
+    session: requests.Session,
+    year: int,
+    month: int,
+    cfg: Optional[RateLimitConfig] = None,
+    journal: str = "",
+    outdir: Path = Path("dw_exports"),
+    debug_dir: Path = Path("dw_debug"),
+    print_snippet: bool = False,
+) -> int:
+    """
+    Export a single month as XML using an already-authenticated session.
+
+    Returns the same exit codes the CLI uses: 0 success, 3 auth/status
+    failure, 4 response-not-XML.
+    """
+    cfg = cfg or RateLimitConfig()
+
     base = "https://www.dreamwidth.org"
     export_url = f"{base}/export"
-    if args.journal:
-        export_url += f"?journal={args.journal}"
+    if journal:
+        export_url += f"?journal={journal}"
 
     LOG.info("Fetching export page")
     r = request_with_retries(session, "GET", export_url, cfg)
     jitter_sleep(cfg)
 
     if "returnto=/export" in r.url or "login" in r.url.lower():
-        write_debug_artifacts(Path(args.debug_dir), args.year, args.month, "get_export_redirect", r, export_url)
+        write_debug_artifacts(debug_dir, year, month, "get_export_redirect", r, export_url)
         LOG.error("Not authenticated (redirected to login). Re-export cookies.")
         return 3
 
     if r.status_code != 200:
-        write_debug_artifacts(Path(args.debug_dir), args.year, args.month, "get_export_badstatus", r, export_url)
+        write_debug_artifacts(debug_dir, year, month, "get_export_badstatus", r, export_url)
         return 3
 
     try:
-        form = choose_export_form(r.text)
+        # Parse once with the C-accelerated lxml parser and walk the form's
+        # input/select tags once; every helper reuses the cached lists.
+        soup = BeautifulSoup(r.text, "lxml")
+        form = choose_export_form(soup)
         action = form.get("action", "/export")
-        payload = build_form_payload(form)
-        year_field, month_field = guess_year_month_field_names(form)
+        inputs = form.find_all("input")
+        selects = form.find_all("select")
+        payload = build_form_payload(form, inputs, selects)
+        year_field, month_field = guess_year_month_field_names(selects)
 
         # Override year/month
-        payload[year_field] = str(args.year)
-        payload[month_field] = str(args.month)
+        payload[year_field] = str(year)
+        payload[month_field] = str(month)
 
         # Force output format to XML if possible
-        force_output_format_xml(form, payload)
+        force_output_format_xml(inputs, selects, payload)
 
     except Exception:
-        write_debug_artifacts(Path(args.debug_dir), args.year, args.month, "get_export_parsefail", r, export_url)
+        write_debug_artifacts(debug_dir, year, month, "get_export_parsefail", r, export_url)
         raise
 
     post_url = urljoin(base + "/", action.lstrip("/"))
     LOG.debug("POST url: %s", post_url)
-    LOG.debug("POST payload keys: %s", sorted(payload.keys()))
+    if LOG.isEnabledFor(logging.DEBUG):
+        # sorting the key list is debug-only work
+        LOG.debug("POST payload keys: %s", sorted(payload.keys()))
 
-    LOG.info("Requesting export for %04d-%02d", args.year, args.month)
-    pr = request_with_retries(session, "POST", post_url, cfg, data=payload)
+    LOG.info("Requesting export for %04d-%02d", year, month)
+    pr = request_with_retries(session, "POST", post_url, cfg, data=payload, stream=True)
     jitter_sleep(cfg)
 
-    if not looks_like_xml_export(pr):
-        write_debug_artifacts(Path(args.debug_dir), args.year, args.month, "post_export_notxml", pr, post_url)
-        if args.print_snippet:
+    # Sniff only the first few KB to classify the response; the rest of the
+    # body streams straight to disk without ever being held in memory.
+    head = pr.raw.read(8192, decode_content=True)
+
+    if not looks_like_xml_export(pr.headers.get("Content-Type") or "", head):
+        body = head + pr.raw.read(decode_content=True)
+        write_debug_artifacts(
+            debug_dir, year, month, "post_export_notxml", pr, post_url, body=body
+        )
+        if print_snippet:
             print("\n--- response snippet (first 2000 chars) ---\n")
-            print(pr.text[:2000])
+            print(body.decode("utf-8", errors="replace")[:2000])
             print("\n--- end snippet ---\n")
         LOG.error("Response does not look like XML export")
         return 4
 
-    outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
-    name = args.journal or "default"
-    out = outdir / f"dw_export_{name}_{args.year:04d}-{args.month:02d}.xml"
-    out.write_text(pr.text, encoding="utf-8", errors="replace")
+    name = journal or "default"
+    out = outdir / f"dw_export_{name}_{year:04d}-{month:02d}.xml"
+    with out.open("wb") as f:
+        f.write(head)
+        while True:
+            chunk = pr.raw.read(65536, decode_content=True)
+            if not chunk:
+                break
+            f.write(chunk)
 
     LOG.info("Saved %s", out)
     return 0
 
 
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Export a single Dreamwidth journal month as XML")
+    ap.add_argument("--year", type=int, required=True, help="Year to export (e.g. 2006)")
+    ap.add_argument("--month", type=int, required=True, help="Month to export (1–12)")
+    ap.add_argument("--cookie-file", help="Netscape cookies.txt containing dreamwidth.org cookies")
+    ap.add_argument("--cookie-header", help="Raw Cookie header from browser devtools")
+    ap.add_argument("--journal", default="", help="Journal/community name (optional)")
+    ap.add_argument("--outdir", default="dw_exports", help="Output directory for XML exports")
+    ap.add_argument("--debug-dir", default="dw_debug", help="Directory to write failure responses")
+    ap.add_argument("--print-snippet", action="store_true", help="Print first ~2k chars of failure response")
+    ap.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING, ERROR")
+    args = ap.parse_args()
+
+    configure_logging(args.log_level)
+
+    if not (1 <= args.month <= 12):
+        LOG.error("--month must be between 1 and 12")
+        return 2
+    if not args.cookie_file and not args.cookie_header:
+        LOG.error("You must supply --cookie-file or --cookie-header")
+        return 2
+
+    session = build_session(
+        cookie_file=Path(args.cookie_file) if args.cookie_file else None,
+        cookie_header=args.cookie_header,
+    )
+
+    return export_month(
+        session,
+        args.year,
+        args.month,
+        journal=args.journal,
+        outdir=Path(args.outdir),
+        debug_dir=Path(args.debug_dir),
+        print_snippet=args.print_snippet,
+    )
+
+
 if __name__ == "__main__":
     sys.exit(main())
 